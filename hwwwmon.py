@@ -1,34 +1,83 @@
 #!/usr/bin/python3
 import argparse
-import glob
-import http.server
+import array
+import asyncio
+import gzip
+import hashlib
 import json
-import os.path
-import re
+import os
+import signal
 import socket
 from string import Template
 import time
-import urllib.parse
+import zlib
+
+try:
+    # Optional, keeps the dict-encoding paths off the pure-Python encoder
+    import orjson
+
+    def json_dumps(v):
+        return orjson.dumps(v)
+except ImportError:
+    def json_dumps(v):
+        return json.dumps(v).encode("utf8")
+
+try:
+    # Optional, turns per-sensor scaling into one vectorised pass
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_UPDATE_RATE = 0.3
+# Sensors that take longer than this to read get demoted to one read
+# every SLOW_READ_STRIDE ticks (PMBus &c can take >1ms per read)
+SLOW_READ_NS = 500_000
+SLOW_READ_STRIDE = 10
+# Samples a lagging SSE client can have queued before we start
+# coalescing by dropping its oldest
+SSE_QUEUE_MAX = 16
+# Ticks between full SSE snapshots; in between, clients get only the
+# sensors that changed since the last snapshot
+FULL_SNAPSHOT_EVERY = 32
 
 
 class Mons:
     def __init__(self):
+        self.scan()
+
+    def scan(self):
         self.mons = dict()
         self.type_titles = dict()
 
         def slurp(path, ifnotexist=""):
-            if not os.path.exists(path):
+            # One-shot reads of tiny name/label files; os.read skips
+            # the buffered-IO and TextIOWrapper setup open() would do
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
                 return ifnotexist
-            with open(path, "r") as f:
-                return f.read().strip()
+            try:
+                return os.read(fd, 256).decode("utf8").strip()
+            finally:
+                os.close(fd)
+
+        mon_paths = []
+        try:
+            for mon_dir in os.scandir("/sys/class/hwmon"):
+                for f in os.scandir(mon_dir.path):
+                    if f.name.endswith("_input"):
+                        mon_paths.append(f.path)
+        except FileNotFoundError:  # Kernel without hwmon support
+            pass
 
-        for mon_path in sorted(glob.glob("/sys/class/hwmon/*/*_input")):
-            mon_type = re.sub(r'\d.*', '', os.path.basename(mon_path))
+        for mon_path in sorted(mon_paths):
+            mon_stem = os.path.basename(mon_path)[:-len("_input")]  # e.g. temp1
+            mon_type = mon_stem.rstrip("0123456789")
             mon_dirpath = os.path.dirname(mon_path)
             mon_name = "%s:%s %s" % (
-                re.sub(r'hwmon', '', os.path.basename(mon_dirpath)),
+                os.path.basename(mon_dirpath).removeprefix("hwmon"),
                 slurp(os.path.join(mon_dirpath, "name")),
-                slurp(re.sub(r'_input$', '_label', mon_path), ifnotexist=re.sub(r'_input$', '', os.path.basename(mon_path))),
+                slurp(mon_path[:-len("_input")] + "_label", ifnotexist=mon_stem),
             )
 
             # https://www.kernel.org/doc/html/latest/hwmon/sysfs-interface.html
@@ -61,87 +110,383 @@ class Mons:
                 self.mons[mon_type] = dict()
             self.mons[mon_type][mon_path] = dict(
                 name=mon_name,
-                fh=open(mon_path, 'r'),
+                fd=os.open(mon_path, os.O_RDONLY | os.O_NONBLOCK),
                 scale=mon_scale,
                 offset=mon_offset,
             )
 
+        # Names and titles only change on (re)scan, so pre-render the
+        # JSON down to the numeric values and let collect_bytes() fill
+        # those in with a single bytes-format per tick
+        def j(v):
+            return json.dumps(v).replace('%', '%%')
+        fmt = '{"_errors":[],"_titles":%s' % j(self.type_titles)
+        for mon_type in self.mons.keys():
+            fmt += ',%s:{%s}' % (j(mon_type), ','.join(
+                '%s:%%.12g' % j(m['name']) for m in self.mons[mon_type].values()))
+        self._fmt = (fmt + '}').encode("utf8")
+        # Parallel per-sensor arrays in skeleton order for the hot
+        # loop: no dict lookups per tick, one reusable value slot per
+        # sensor (values persist, so demoted sensors keep their last
+        # reading) and a countdown of ticks left to skip
+        flat = [
+            m for d in self.mons.values() for m in d.values()]
+        self._fds = array.array('i', (m['fd'] for m in flat))
+        self._scales = tuple(m['scale'] for m in flat)
+        self._offsets = tuple(m['offset'] for m in flat)
+        self._keys = tuple(
+            (mon_type, m['name'])
+            for mon_type, d in self.mons.items() for m in d.values())
+        # The same keys pre-encoded, so delta frames are a byte join
+        # rather than dict building plus a JSON encoder pass
+        self._jkeys = tuple(
+            (json.dumps(t).encode("utf8"), json.dumps(n).encode("utf8") + b":")
+            for t, n in self._keys)
+        # Unscaled sensors (fan RPM &c) hold a plain ASCII integer that
+        # is already valid JSON, so their sysfs bytes can be spliced
+        # into a frame without ever parsing them
+        self._raw_json = tuple(
+            s == 1 and o == 0 for s, o in zip(self._scales, self._offsets))
+        self._changed = set()
+        self._vals = array.array('d', [0.0] * len(self._fds))
+        self._skips = bytearray(len(self._fds))
+        self._raw = array.array('q', [0] * len(self._fds))
+        self._rbuf = bytearray(32)
+        self._last = [b""] * len(self._fds)
+        if numpy is not None:
+            self._np_raw = numpy.frombuffer(self._raw, dtype=numpy.int64)
+            self._np_vals = numpy.zeros(len(self._fds))
+            self._np_scales = numpy.array(self._scales)
+            self._np_offsets = numpy.array(self._offsets)
+
+    def collect_bytes(self):
+        try:
+            vals = self._vals
+            skips = self._skips
+            raw = self._raw
+            rbuf = self._rbuf
+            last = self._last
+            scales = self._scales
+            offsets = self._offsets
+            changed_add = self._changed.add
+            preadv = os.preadv
+            monotonic_ns = time.monotonic_ns
+            for i, fd in enumerate(self._fds):
+                if skips[i]:
+                    skips[i] -= 1
+                else:
+                    t = monotonic_ns()
+                    n = preadv(fd, (rbuf,), 0)
+                    if monotonic_ns() - t > SLOW_READ_NS:
+                        skips[i] = SLOW_READ_STRIDE - 1
+                    chunk = rbuf[:n]
+                    # Idle sensors repeat the same bytes; don't re-parse.
+                    # Only cache after int() succeeds, so a sensor stuck
+                    # on bad bytes keeps taking the error route below
+                    if chunk != last[i]:
+                        raw[i] = v = int(chunk)
+                        last[i] = bytes(chunk)
+                        if numpy is None:
+                            vals[i] = v * scales[i] + offsets[i]
+                        changed_add(i)
+            if numpy is not None:
+                # One multiply-add across all sensors instead of one each
+                numpy.multiply(self._np_raw, self._np_scales, out=self._np_vals)
+                self._np_vals += self._np_offsets
+                vals = self._np_vals
+            return self._fmt % tuple(vals)
+        except (OSError, ValueError):
+            # Slow path reports which sensor failed in _errors; a
+            # removed device can also hand us empty bytes, so int()
+            # failures take the same route
+            return json_dumps(self.collect())
+
+    def delta_bytes(self):
+        # Everything that changed since MonHub last reset_delta()ed
+        vals = self._np_vals if numpy is not None else self._vals
+        out = dict()
+        for i in sorted(self._changed):
+            type_key, name_key = self._jkeys[i]
+            if self._raw_json[i]:
+                val = self._last[i].strip()
+            else:
+                val = b"%.12g" % vals[i]
+            out.setdefault(type_key, []).append(name_key + val)
+        return b'{"delta":{%s}}' % b",".join(
+            b"%s:{%s}" % (type_key, b",".join(sensors))
+            for type_key, sensors in out.items())
+
+    def reset_delta(self):
+        self._changed.clear()
+
     def collect(self):
         out = dict(_errors=[], _titles=self.type_titles)
         for mon_type in self.mons.keys():
             out[mon_type] = dict()
             for mon_path, m in self.mons[mon_type].items():
-                m['fh'].seek(0)
                 try:
-                    out[mon_type][m['name']] = int(m['fh'].read()) * m['scale'] + m['offset']
-                except OSError:
+                    out[mon_type][m['name']] = int(os.pread(m['fd'], 32, 0)) * m['scale'] + m['offset']
+                except (OSError, ValueError):
                     out['_errors'].append("Failed to read %s" % mon_path)
         return out
 
     def close(self):
         for mon_type in self.mons.keys():
             for mon_path, m in self.mons[mon_type].items():
-                m['fh'].close()
+                os.close(m['fd'])
         self.mons = dict()
 
-class HwmRequestHandler(http.server.SimpleHTTPRequestHandler):
-    # https://docs.python.org/3/library/http.server.html#http.server.BaseHTTPRequestHandler
-
-    def do_GET(self):
-        u = urllib.parse.urlparse(self.path)
-        qs = urllib.parse.parse_qs(u.query)
-
-        if u.path == "/":
-            return self.do_index()
-        if u.path == "/mon.json":
-            return self.do_mon()
-        if u.path == "/mon.sse":
-            return self.do_mon_sse(qs)
-
-        self.send_response(404)
-        self.send_header("Content-type", "text/plain")
-        self.end_headers()
-        self.wfile.write(b"Not found")
-
-    def do_index(self):
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        self.wfile.write(PAGE_HTML)
-
-    def do_mon(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-        mons = Mons()
+    def rescan(self):
+        # Pick up hot-plugged (or removed) sensors without a restart
+        self.close()
+        self.scan()
+
+class MonHub:
+    # Collects once per tick, fans the encoded payload out to every
+    # subscribed SSE client via its own asyncio.Queue
+    def __init__(self, mons, update_rate=DEFAULT_UPDATE_RATE):
+        self.mons = mons
+        self.update_rate = update_rate
+        self.subscribers = dict()  # queue -> [update_rate, next_due, needs_full]
+        self.last_full = None
+        self.ticks_to_full = 0
+        self._wakeup = asyncio.Event()
+
+    def subscribe(self, update_rate=DEFAULT_UPDATE_RATE):
+        q = asyncio.Queue(SSE_QUEUE_MAX)
+        self.subscribers[q] = [update_rate, 0.0, self.last_full is None]
+        if self.last_full is not None:
+            # Catch the newcomer up so later deltas have a base to merge into
+            q.put_nowait(self.last_full)
+        # Don't make the newcomer wait out a slower client's tick interval
+        self._wakeup.set()
+        return q
+
+    def unsubscribe(self, q):
+        self.subscribers.pop(q, None)
+
+    def rescan(self):
+        self.mons.rescan()
+        # The old snapshot doesn't match the new sensor set; broadcast
+        # a fresh full next tick rather than deltas nobody can merge
+        self.last_full = None
+
+    async def run(self):
+        # Tick at the fastest rate any client asked for, slower clients
+        # get every frame whose due time has passed
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            if self.subscribers:
+                try:
+                    self.tick(deadline)
+                except Exception as e:
+                    # One bad tick mustn't kill the daemon for every
+                    # client; skip the frame and carry on
+                    print(f"Tick failed: {e!r}")
+            rates = [sub[0] for sub in self.subscribers.values()]
+            # Sleep to a monotonic deadline, so collect/encode time
+            # doesn't stretch the cadence; if we overran, skip ahead
+            # rather than trying to catch up
+            deadline += min(rates) if rates else self.update_rate
+            now = loop.time()
+            if deadline < now:
+                deadline = now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), deadline - now)
+                # Woken early by a new subscriber; tick for them now and
+                # restart the grid from here
+                deadline = loop.time()
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def tick(self, deadline):
+        payload = self.mons.collect_bytes()
+        full = self.ticks_to_full <= 0 or self.last_full is None
+        if full:
+            self.last_full = payload
+            self.mons.reset_delta()
+            self.ticks_to_full = FULL_SNAPSHOT_EVERY
+        else:
+            payload = self.mons.delta_bytes()
+        self.ticks_to_full -= 1
+        for q, sub in self.subscribers.items():
+            # Pace clients off the tick grid, not the post-collect
+            # clock, so a client at the hub rate lands on every tick
+            if deadline < sub[1]:
+                if full:
+                    # Skipped a snapshot; deltas alone won't
+                    # bring this client up to date any more
+                    sub[2] = True
+                continue
+            # Client can't keep up? Shed its oldest samples so
+            # its backlog stays bounded
+            needed = 2 if not full and sub[2] else 1
+            while q.qsize() > SSE_QUEUE_MAX - needed:
+                q.get_nowait()
+                if not full:
+                    # The shed frame may have been the snapshot the
+                    # remaining deltas merge into; resync the client
+                    sub[2] = True
+                    needed = 2
+            if not full and sub[2]:
+                q.put_nowait(self.last_full)
+            sub[2] = False
+            q.put_nowait(payload)
+            sub[1] = deadline + sub[0]
+
+
+class HwmServer:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def send_headers(self, writer, status, headers, close=False):
+        # One write per response head, not one per header line
+        writer.write(b"HTTP/1.1 %d %s\r\n%s%s\r\n" % (
+            status,
+            {200: b"OK", 304: b"Not Modified", 400: b"Bad Request", 404: b"Not Found"}[status],
+            b"".join(k + b": " + v + b"\r\n" for k, v in headers),
+            b"Connection: close\r\n" if close else b"Connection: keep-alive\r\n",
+        ))
+
+    async def handle_request(self, reader, writer):
+        # Handle requests until the client closes or asks us to, so a
+        # browser polling /mon.json reuses one TCP connection
         try:
-            self.wfile.write(json.dumps(mons.collect()).encode("utf8"))
+            while True:
+                request_line = await reader.readline()
+                parts = request_line.split()
+                if len(parts) < 2 or parts[0] != b"GET":
+                    return
+                headers = dict()
+                # Same cap http.server uses; a junk client doesn't get
+                # to feed us headers forever
+                for _ in range(100):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                else:
+                    return
+
+                path, _, query = parts[1].decode("latin1").partition("?")
+
+                if path == "/":
+                    await self.do_index(writer, headers)
+                elif path == "/mon.json":
+                    await self.do_mon(writer, headers)
+                elif path == "/mon.sse":
+                    # Streams until disconnect, nothing left to keep alive
+                    return await self.do_mon_sse(writer, headers, query)
+                else:
+                    writer.write(RESP_NOT_FOUND)
+                    await writer.drain()
+                if headers.get("connection") == "close":
+                    return
+        except (ConnectionResetError, BrokenPipeError, OSError, ValueError):
+            # OSErrors are disconnects; ValueError is readline() hitting
+            # the 64KiB stream limit on an absurd request or header line
+            pass
         finally:
-            mons.close()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionResetError, BrokenPipeError, OSError):
+                pass
+
+    async def do_index(self, writer, headers):
+        # The page is baked at import, so revalidation is a hash check
+        # and both responses are single pre-built writes
+        if headers.get("if-none-match") == PAGE_ETAG:
+            writer.write(RESP_NOT_MODIFIED)
+        elif "gzip" in headers.get("accept-encoding", ""):
+            writer.write(RESP_INDEX_GZ)
+        else:
+            writer.write(RESP_INDEX)
+        await writer.drain()
+
+    async def do_mon(self, writer, headers):
+        payload = self.hub.mons.collect_bytes()
+        self.send_headers(writer, 200, [
+            (b"Content-Type", b"application/json"),
+            (b"Content-Length", b"%d" % len(payload)),
+        ])
+        writer.write(payload)
+        await writer.drain()
 
-    def do_mon_sse(self, qs):
+    async def do_mon_sse(self, writer, headers, query):
         # https://developer.mozilla.org/en-US/docs/Web/API/Server-sent_events/Using_server-sent_events
         # curl -N http:/localhost:8000/mon.sse
-        update_rate = int("".join(qs.get("update-rate", ["300"]))) / 1000
-
-        self.send_response(200)
-        self.send_header("X-Accel-Buffering", "no");
-        self.send_header("Content-Type", "text/event-stream");
-        self.send_header("Cache-Control", "no-cache");
-        self.end_headers()
-        mons = Mons()
+        # update-rate is our only query parameter, so pick it out of the
+        # query string directly rather than parse_qs building dicts;
+        # clamp so one client can't pin the hub in a tight sysfs loop
+        try:
+            rate_ms = 300
+            i = query.find("update-rate=")
+            if i >= 0:
+                j = query.find("&", i)
+                rate_ms = int(query[i + len("update-rate="):j if j >= 0 else None])
+            update_rate = max(50, min(60000, rate_ms)) / 1000
+        except ValueError:
+            body = b"update-rate must be a number of milliseconds"
+            self.send_headers(writer, 400, [
+                (b"Content-Type", b"text/plain"),
+                (b"Content-Length", b"%d" % len(body)),
+            ], close=True)
+            writer.write(body)
+            await writer.drain()
+            return
+
+        # The JSON repeats sensor names every tick, so even per-event
+        # gzip flushes compress the stream well
+        compress = None
+        response_headers = [
+            (b"X-Accel-Buffering", b"no"),
+            (b"Content-Type", b"text/event-stream"),
+            (b"Cache-Control", b"no-cache"),
+        ]
+        if "gzip" in headers.get("accept-encoding", ""):
+            compress = zlib.compressobj(wbits=31)  # wbits 16+15: gzip wrapper
+            response_headers.append((b"Content-Encoding", b"gzip"))
+        self.send_headers(writer, 200, response_headers, close=True)
+        q = self.hub.subscribe(update_rate)
+        # Bind the per-tick callables once so the loop body runs on
+        # LOAD_FAST rather than repeated attribute lookups
+        q_get, q_empty, q_get_nowait = q.get, q.empty, q.get_nowait
+        write, drain = writer.write, writer.drain
         try:
             while True:
-                try:
-                    self.wfile.write(b"data: ")
-                    self.wfile.write(json.dumps(mons.collect()).encode("utf8"))
-                    self.wfile.write(b"\n\n")
-                    self.wfile.flush()
-                except (BrokenPipeError, OSError):
-                    return
-                time.sleep(update_rate)
+                # If more samples queued up while we were blocked, send
+                # them all as one array-valued event
+                batch = [await q_get()]
+                while not q_empty():
+                    batch.append(q_get_nowait())
+                if len(batch) == 1:
+                    frame = b"data: " + batch[0] + b"\n\n"
+                else:
+                    frame = b"data: [" + b",".join(batch) + b"]\n\n"
+                if compress:
+                    frame = compress.compress(frame) + compress.flush(zlib.Z_SYNC_FLUSH)
+                write(frame)
+                await drain()
         finally:
-            mons.close()
+            self.hub.unsubscribe(q)
+
+
+async def serve(listen, port):
+    mons = Mons()
+    hub = MonHub(mons)
+    # Keep a reference, so the hub task can't be garbage-collected
+    hub_task = asyncio.create_task(hub.run())  # noqa: F841
+    # kill -HUP to rescan after hot-plugging sensors
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, hub.rescan)
+
+    server = HwmServer(hub)
+    async with await asyncio.start_server(server.handle_request, listen, port) as s:
+        await s.serve_forever()
+
 
 def main():
     parser = argparse.ArgumentParser(description='Start hwwwmon')
@@ -161,8 +506,7 @@ def main():
 
     listen_ip = socket.gethostbyname(socket.gethostname()) if args.listen == '0.0.0.0' else args.listen
     print(f"Listening on http://{listen_ip}:{args.port}")
-    httpd = http.server.ThreadingHTTPServer((args.listen, args.port), HwmRequestHandler)
-    httpd.serve_forever()
+    asyncio.run(serve(args.listen, args.port))
 
 PAGE_HTML = Template("""
 <!DOCTYPE html>
@@ -205,6 +549,7 @@ section {
     <div id="chart-container"></div>
     <script>
 const mon_charts={};
+window.monData = {};
 
 function updateCharts(mon_data, updateCharts, maxPoints) {
     // https://www.chartjs.org/docs/latest/charts/line.html
@@ -252,21 +597,40 @@ function updateCharts(mon_data, updateCharts, maxPoints) {
                         },
                     },
                 });
+                // Dataset index by sensor name, instead of scanning
+                // every dataset's label per sensor per tick
+                mon_charts[mon_type].labelIdx = new Map();
             }
             const chart = mon_charts[mon_type];
-            chart.data.labels.push(timeStr);
-            while (chart.data.labels.length > maxPoints) chart.data.labels.shift();
+            if (chart.ringSize !== maxPoints) {
+                // First sample, or the user changed maxPoints: fresh rings
+                chart.ringSize = maxPoints;
+                chart.ringHead = 0;
+                chart.ringLabels = Array(maxPoints).fill("");
+                chart.data.datasets.forEach((ds) => { ds.ring = Array(maxPoints).fill(NaN); });
+            }
+            const head = chart.ringHead;
+            chart.ringLabels[head] = timeStr;
             Object.keys(mon_data[mon_type]).forEach((mon_name) => {
                 if (mon_name === "_title") return;
-                let i = 0
-                for (i = 0; i < chart.data.datasets.length; i++) {
-                    if (chart.data.datasets[i].label === mon_name) break;
+                let i = chart.labelIdx.get(mon_name);
+                if (i === undefined) {
+                    i = chart.data.datasets.length;
+                    chart.data.datasets.push({ label: mon_name, data: [], ring: Array(maxPoints).fill(NaN) });
+                    chart.labelIdx.set(mon_name, i);
                 }
-                if (i >= chart.data.datasets.length) chart.data.datasets.push({ label: mon_name, data: Array(maxPoints).fill(NaN) });
-                chart.data.datasets[i].data.push(mon_data[mon_type][mon_name]);
-                while (chart.data.datasets[i].data.length > maxPoints) chart.data.datasets[i].data.shift();
+                chart.data.datasets[i].ring[head] = mon_data[mon_type][mon_name];
             });
-            if (updateCharts) chart.update();
+            chart.ringHead = (head + 1) % maxPoints;
+            if (updateCharts) {
+                // Only unroll the rings into chronological arrays when
+                // we're actually going to paint
+                chart.data.labels = chart.ringLabels.slice(chart.ringHead).concat(chart.ringLabels.slice(0, chart.ringHead));
+                chart.data.datasets.forEach((ds) => {
+                    ds.data = ds.ring.slice(chart.ringHead).concat(ds.ring.slice(0, chart.ringHead));
+                });
+                chart.update();
+            }
         });
     });
 }
@@ -279,7 +643,19 @@ function monStart() {
     window.evtSource = new EventSource(`/mon.sse?update-rate=${updateRate}`);
     window.evtSource.onmessage = (event) => {
         const maxPoints = parseInt(document.getElementById("max-points").value, 10);
-        return updateCharts(JSON.parse(event.data), window.hwUpdateCharts, maxPoints);
+        let samples = JSON.parse(event.data);
+        if (!Array.isArray(samples)) samples = [samples];
+        return samples.reduce((p, s) => p.then(() => {
+            if (s.delta) {
+                // Merge changed sensors into the last full snapshot
+                Object.keys(s.delta).forEach((mon_type) => {
+                    window.monData[mon_type] = Object.assign(window.monData[mon_type] || {}, s.delta[mon_type]);
+                });
+            } else {
+                window.monData = s;
+            }
+            return updateCharts(window.monData, window.hwUpdateCharts, maxPoints);
+        }), Promise.resolve());
     };
 }
 
@@ -299,6 +675,39 @@ window.addEventListener("beforeunload", monStop);
   </body>
 </html>
 """).safe_substitute(hostname = socket.gethostname()).encode("utf8")
+PAGE_ETAG = '"%s"' % hashlib.blake2b(PAGE_HTML, digest_size=8).hexdigest()
+
+# Whole responses for the fixed routes, assembled once at import
+RESP_NOT_FOUND = (
+    b"HTTP/1.1 404 Not Found\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 9\r\n"
+    b"Connection: keep-alive\r\n\r\n"
+    b"Not found")
+RESP_NOT_MODIFIED = (
+    b"HTTP/1.1 304 Not Modified\r\n"
+    b"ETag: %s\r\n"
+    b"Connection: keep-alive\r\n\r\n") % PAGE_ETAG.encode("utf8")
+PAGE_HTML_GZ = gzip.compress(PAGE_HTML, 9)
+RESP_INDEX = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: %d\r\n"
+    b"ETag: %s\r\n"
+    b"Cache-Control: max-age=3600\r\n"
+    b"Vary: Accept-Encoding\r\n"
+    b"Connection: keep-alive\r\n\r\n" % (len(PAGE_HTML), PAGE_ETAG.encode("utf8"))
+) + PAGE_HTML
+RESP_INDEX_GZ = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Encoding: gzip\r\n"
+    b"Content-Length: %d\r\n"
+    b"ETag: %s\r\n"
+    b"Cache-Control: max-age=3600\r\n"
+    b"Vary: Accept-Encoding\r\n"
+    b"Connection: keep-alive\r\n\r\n" % (len(PAGE_HTML_GZ), PAGE_ETAG.encode("utf8"))
+) + PAGE_HTML_GZ
 
 if __name__ == '__main__':
     main()